@@ -1,11 +1,31 @@
 import json
 import os
+import queue
+import threading
 import time
 import tkinter as tk
 from tkinter import messagebox
-from solver import NonogramSolver
+from solver import NonogramSolver, board_line_keys, line_possibilities
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib json module
+    orjson = None
+
+def json_loads(raw:bytes):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def json_dumps(data) -> bytes:
+    # same 2-space layout from both backends
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
 
 class CreateLevelGUI:
+    CELL = 20
+
     def __init__(self, root:tk.Tk):
         # Variables
         self.root = root
@@ -33,33 +53,86 @@ class CreateLevelGUI:
         
         tk.Button(top, text='Solve Level', command=self.on_solve).grid(row=0, column=6, columnspan=2, pady=(0,5))
 
-        # update fields automatically when row/col count changes
+        # update fields automatically when row/col count changes; a burst of
+        # writes (typing, holding a spinbox arrow) collapses into one rebuild
+        self.pending_rebuild = None
         try:
             # modern tkinter: trace_add
-            self.rows_var.trace_add('write', lambda *a: self.generate_fields())
-            self.cols_var.trace_add('write', lambda *a: self.generate_fields())
+            self.rows_var.trace_add('write', lambda *a: self.schedule_rebuild())
+            self.cols_var.trace_add('write', lambda *a: self.schedule_rebuild())
         except AttributeError:
             # older tkinter: trace
-            self.rows_var.trace('w', lambda *a: self.generate_fields())
-            self.cols_var.trace('w', lambda *a: self.generate_fields())
+            self.rows_var.trace('w', lambda *a: self.schedule_rebuild())
+            self.cols_var.trace('w', lambda *a: self.schedule_rebuild())
 
 
         # container for clue entries
         self.container = tk.Frame(root)
         self.container.pack(padx=8, pady=8, fill='both', expand=True)
 
+        # top-left empty label
+        tk.Label(self.container, text='').grid(row=0, column=0)
+        # Draw the solution cells as rectangles on one canvas spanning the same grid
+        # slots, so everything still appears as one matrix (see place_cells)
+        self.solution_grid = tk.Canvas(self.container, width=1, height=1, highlightthickness=0)
+        self.solution_grid.bind('<Configure>', self.place_cells)
+
+        # widgets are kept when the board shrinks (hidden, not destroyed) and
+        # reused when it grows again; last_R/last_C is the size currently shown
+        self.last_R = 0
+        self.last_C = 0
+        self.row_entry_pool = []
+        self.col_entry_pool = []
+        self.cell_pool = {}
+        self.col_entries = []
+        self.row_entries = []
+        self.solution_cells = []
+
         # area to display solution (initially empty)
         self.solution_frame = tk.Frame(root)
         self.solution_frame.pack(padx=8, pady=(0,8), fill='both', expand=False)
         self.solution_canvas = None
         self.solution_info_label = None
 
+        # background solve: the worker thread posts its result here, poll_solver reads it;
+        # grid_generation counts grid rebuilds so a result for an older grid is dropped
+        self.result_queue = None
+        self.grid_generation = 0
+        self.solve_generation = None
+
         # initial generation
         self.generate_fields()
 
-    def clear_container(self):
-        for w in self.container.winfo_children():
-            w.destroy()
+    def schedule_rebuild(self):
+        if self.pending_rebuild:
+            self.root.after_cancel(self.pending_rebuild)
+        self.pending_rebuild = self.root.after(150, self.do_rebuild)
+
+    def do_rebuild(self):
+        self.pending_rebuild = None
+        self.generate_fields()
+
+    def resize_entries(self, pool, old, new, make):
+        """Show the first new entries of pool, creating missing ones with make(i), hide the rest."""
+        for e in pool[new:old]:
+            e.grid_remove()
+        for i in range(old, new):
+            if i < len(pool):
+                pool[i].delete(0, 'end')
+                pool[i].grid()
+            else:
+                pool.append(make(i))
+        return pool[:new]
+
+    def make_col_entry(self, c):
+        e = tk.Entry(self.container, width=8)
+        e.grid(row=0, column=c+1, padx=2, pady=2)
+        return e
+
+    def make_row_entry(self, r):
+        e = tk.Entry(self.container, width=20)
+        e.grid(row=r+1, column=0, padx=2, pady=2, sticky='w')
+        return e
 
     def parse_clue_text(self, text:str):
         text = text.strip()
@@ -72,7 +145,6 @@ class CreateLevelGUI:
             return None
 
     def generate_fields(self):
-        self.clear_container()
         # robustly parse values from the IntVars (user may type invalid text)
         try:
             R = max(1, int(self.rows_var.get()))
@@ -82,34 +154,33 @@ class CreateLevelGUI:
             C = max(1, int(self.cols_var.get()))
         except Exception:
             C = 1
-        # top-left empty label
+        if (R, C) == (self.last_R, self.last_C):
+            return
         # layout: row 0 = column clues (entries), column 0 = row clues (entries)
         # and the solution cells occupy rows 1..R, cols 1..C so the whole looks like one matrix
-        self.col_entries = []
-        self.row_entries = []
-        self.solution_cells = [[None] * C for _ in range(R)]
+        self.col_entries = self.resize_entries(self.col_entry_pool, self.last_C, C, self.make_col_entry)
+        self.row_entries = self.resize_entries(self.row_entry_pool, self.last_R, R, self.make_row_entry)
+        self.last_R, self.last_C = R, C
+        self.grid_generation += 1
 
-        tk.Label(self.container, text='').grid(row=0, column=0)
-
-        for c in range(C):
-            e = tk.Entry(self.container, width=8)
-            e.grid(row=0, column=c+1, padx=2, pady=2)
-            e.insert(0, '')
-            self.col_entries.append(e)
-
-        for r in range(R):
-            e = tk.Entry(self.container, width=20)
-            e.grid(row=r+1, column=0, padx=2, pady=2, sticky='w')
-            e.insert(0, '')
-            self.row_entries.append(e)
-
-        # Create solution cell widgets in the same grid so everything appears as one matrix
-        CELL = 20
+        canvas = self.solution_grid
+        canvas.grid(row=1, column=1, rowspan=R, columnspan=C, sticky='nsew')
+        # raw Tcl calls skip the option parsing of Canvas.itemconfig for every cell
+        call, path = canvas.tk.call, canvas._w
+        for (r, c), item in self.cell_pool.items():
+            if r >= R or c >= C:
+                call(path, 'itemconfigure', item, '-state', 'hidden')
+        self.solution_cells = [[None] * C for _ in range(R)]
         for r in range(R):
             for c in range(C):
-                cell = tk.Canvas(self.container, width=CELL, height=CELL, bg='white', highlightthickness=1, highlightbackground='gray')
-                cell.grid(row=r+1, column=c+1, padx=0, pady=0)
-                self.solution_cells[r][c] = cell
+                item = self.cell_pool.get((r, c))
+                if item is None:
+                    item = canvas.create_rectangle(0, 0, self.CELL, self.CELL, fill='white', outline='gray')
+                    self.cell_pool[(r, c)] = item
+                else:
+                    call(path, 'itemconfigure', item, '-state', 'normal', '-fill', 'white')
+                self.solution_cells[r][c] = item
+        canvas.after_idle(self.place_cells)
 
         # clear any previous solution display when fields are regenerated
         if self.solution_canvas:
@@ -125,6 +196,20 @@ class CreateLevelGUI:
                 pass
             self.solution_info_label = None
 
+    def place_cells(self, event=None):
+        """Center every solution rectangle on its row/column slot of the container grid."""
+        canvas = self.solution_grid
+        left, top = canvas.winfo_x(), canvas.winfo_y()
+        half = self.CELL // 2
+        call, path = canvas.tk.call, canvas._w
+        for r, row in enumerate(self.solution_cells):
+            _, y, _, h = self.container.grid_bbox(0, r + 1)
+            cy = y - top + h // 2
+            for c, item in enumerate(row):
+                x, _, w, _ = self.container.grid_bbox(c + 1, 0)
+                cx = x - left + w // 2
+                call(path, 'coords', item, cx - half, cy - half, cx + half, cy + half)
+
     def collect_clues(self):
         rows = []
         cols = []
@@ -160,17 +245,24 @@ class CreateLevelGUI:
         data = {}
         if os.path.exists(LEVELS_FILE):
             try:
-                with open(LEVELS_FILE, 'r') as f:
-                    data = json.load(f)
+                with open(LEVELS_FILE, 'rb') as f:
+                    data = json_loads(f.read())
             except (json.JSONDecodeError, FileNotFoundError):
                 data = {}
 
         data[name] = {'rows': rows, 'cols': cols}
+        # write a temporary file and swap it in, so a failed write never truncates the levels
+        tmp = LEVELS_FILE + '.tmp'
         try:
-            with open(LEVELS_FILE, 'w') as f:
-                json.dump(data, f, indent=4)
+            with open(tmp, 'wb') as f:
+                f.write(json_dumps(data))
+            os.replace(tmp, LEVELS_FILE)
         except Exception as ex:
             #messagebox.showerror('Error', f'Failed to write file: {ex}')
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
             return
 
         # messagebox.showinfo('Saved', f"Level '{name}' saved to {LEVELS_FILE}")
@@ -185,34 +277,64 @@ class CreateLevelGUI:
             #messagebox.showerror('Error', err)
             return
 
-        # run solver
-        solver = NonogramSolver(rows, cols)
+        if self.result_queue is not None:
+            # a solve is still running
+            return
+
         self.root.config(cursor='watch')
-        self.root.update()
-        solved = solver.solve(time_limit=10, allow_partial=True, debug=False)
+        self.root.update_idletasks()
+        start = time.time()
+        # look the line possibilities up here: the on-disk line cache must only be
+        # used from this (main) thread; the worker then finds them in memory
+        for key in dict.fromkeys(board_line_keys(rows, cols)):
+            line_possibilities(*key)
+
+        # build and run the solver in a background thread so the window stays responsive
+        self.result_queue = queue.Queue()
+        self.solve_generation = self.grid_generation
+        threading.Thread(target=self.run_solver, args=(rows, cols, start, self.result_queue), daemon=True).start()
+        self.poll_solver()
+
+    def run_solver(self, rows, cols, start, result_queue):
+        # worker thread: must not touch any widget, always posts a result
+        result = (False, None, 0)
+        try:
+            solver = NonogramSolver(rows, cols)
+            solved = solver.solve(time_limit=10, allow_partial=True, debug=False)
+            result = (solved, solver.board, solver.nodes)
+        finally:
+            result_queue.put(result + (time.time() - start,))
+
+    def poll_solver(self):
+        try:
+            solved, board, nodes, elapsed = self.result_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(50, self.poll_solver)
+            return
+        self.result_queue = None
         self.root.config(cursor='')
+        if self.solve_generation != self.grid_generation:
+            # the grid was resized while solving; the board no longer fits it
+            return
 
         if not solved:
             messagebox.showinfo('Result', 'No solution found or timed out.')
             return
 
-        # draw solution into the solution_cells created in the same grid
-        R = len(rows)
-        C = len(cols)
-        for r in range(R):
-            for c in range(C):
+        # color the solution rectangles drawn in the same grid; Tk only
+        # redraws once, in the single update_idletasks after the loop
+        canvas = self.solution_grid
+        call, path = canvas.tk.call, canvas._w
+        for r, row in enumerate(board):
+            for c, val in enumerate(row):
                 try:
-                    cell = self.solution_cells[r][c]
-                    val = solver.board[r][c]
-                    if val == 1:
-                        cell.config(bg='black')
-                    else:
-                        cell.config(bg='white')
+                    call(path, 'itemconfigure', self.solution_cells[r][c], '-fill', 'black' if val == 1 else 'white')
                 except Exception:
                     pass
+        canvas.update_idletasks()
 
         # show info below the grid inside the solution_frame area (reuse label)
-        info = f"Solved in {time.time()-solver.start_time:.2f}s, nodes={solver.nodes}"
+        info = f"Solved in {elapsed:.2f}s, nodes={nodes}"
         if self.solution_info_label:
             try:
                 self.solution_info_label.config(text=info)
@@ -0,0 +1,97 @@
+# kernel_state.py
+"""
+Search state shared by the compiled kernels (solver_core with numba,
+solver_cy with Cython), for boards up to 64x64.
+
+All solver state lives in flat numpy arrays so the search is resumable:
+a kernel stops after a node budget and NonogramSolver calls it again
+until it finishes or the time limit runs out.
+
+Lines are numbered rows first (0..R-1) then columns (R..R+C-1). With
+N = R + C the uint64 state array holds:
+  [0, N)      known mask per line
+  [N, 2N)     fill mask per line
+  [2N, 3N)    number of live candidates per line
+
+The live candidates of a line are a bitset over the indices of its
+possibilities, split into words[line] uint64 words starting at
+live_off[line]. tables holds the transposed possibilities: the bitset of
+the possibilities that fill cell p of a line starts at
+tab_off[line] + p * words[line], so testing a cell against all live
+candidates costs one AND per 64 candidates.
+"""
+import numpy as np
+
+# kernel return codes
+SOLVED = 1
+EXHAUSTED = 0
+BUDGET = -1
+
+# slots of the `scalars` array
+DEPTH = 0
+TRAIL_LEN = 1
+NODES = 2
+REFUTE = 3
+
+
+def new_search(R, C, poss, tables, live, masks, max_cells=64):
+    """
+    Allocate kernel arrays, or None if the board does not fit. poss, tables
+    and live are NonogramSolver's per-line lists (lines with the same clue
+    share their poss/tables objects, which are flattened once); masks holds
+    the known masks then the fill masks of all lines.
+    """
+    if R > max_cells or C > max_cells:
+        return None
+    N = R + C
+    words = np.array([(len(p) + 63) // 64 for p in poss], dtype=np.int64)
+
+    poss_off = np.zeros(N, dtype=np.int64)
+    tab_off = np.zeros(N, dtype=np.int64)
+    flat_poss = []
+    flat_tables = []
+    offsets = {}
+    for line in range(N):
+        key = id(tables[line])
+        if key not in offsets:
+            offsets[key] = (len(flat_poss), len(flat_tables))
+            flat_poss.extend(poss[line])
+            for t in tables[line]:
+                flat_tables.extend(int_to_words(t, words[line]))
+        poss_off[line], tab_off[line] = offsets[key]
+
+    live_off = np.zeros(N + 1, dtype=np.int64)
+    live_off[1:] = np.cumsum(words)
+    live_words = np.zeros(live_off[N], dtype=np.uint64)
+    state = np.zeros(3 * N, dtype=np.uint64)
+    state[:2 * N] = masks
+    for line in range(N):
+        live_words[live_off[line]:live_off[line + 1]] = int_to_words(live[line], words[line])
+        state[2 * N + line] = bin(live[line]).count('1')
+
+    # every decided cell costs at most 4 trail entries, and every live word
+    # or count entry pushed drops at least one candidate
+    size = 4 * R * C + 2 * sum(len(p) for p in poss) + 16
+    return {
+        'poss': np.array(flat_poss, dtype=np.uint64),
+        'poss_off': poss_off,
+        'tables': np.array(flat_tables, dtype=np.uint64),
+        'tab_off': tab_off,
+        'words': words,
+        'live': live_words,
+        'live_off': live_off,
+        'state': state,
+        'trail_idx': np.zeros(size, dtype=np.int64),
+        'trail_old': np.zeros(size, dtype=np.uint64),
+        'queue': np.zeros(N + 1, dtype=np.int64),
+        'queued': np.zeros(N, dtype=np.uint8),
+        'line_at': np.zeros(N + 1, dtype=np.int64),
+        'idx_at': np.zeros(N + 1, dtype=np.int64),
+        'sub': np.zeros(N + 1, dtype=np.int64),
+        'scalars': np.zeros(4, dtype=np.int64),
+    }
+
+
+def int_to_words(bits, n):
+    """Split a python int bitset into n little-endian uint64 words."""
+    return np.frombuffer(bits.to_bytes(8 * int(n), 'little'), dtype='<u8').astype(np.uint64)
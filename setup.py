@@ -0,0 +1,10 @@
+# setup.py
+# Optional Cython build of solver_cy.pyx; the solver runs without it.
+#   python setup.py build_ext --inplace
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name='nonogram-solver',
+    ext_modules=cythonize('solver_cy.pyx', language_level=3),
+)
@@ -1,7 +1,64 @@
 # solver.py
+import atexit
+import dbm
+import shelve
+import threading
 import time
 from functools import lru_cache
 
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, line_bit_tables then transposes in plain python
+    np = None
+try:
+    import solver_core
+except ImportError:  # numba is optional, the search then runs in plain python
+    solver_core = None
+try:
+    import solver_cy
+except ImportError:  # built by setup.py, optional like numba
+    solver_cy = None
+
+# compiled search kernel: the ahead-of-time Cython build when present,
+# else the numba one, else None (plain python search)
+kernel = solver_cy or solver_core
+
+# on-disk cache of line_possibilities results, shared between runs
+LINE_CACHE_FILE = '.line_cache.db'
+_line_shelf = None
+_line_shelf_failed = False
+
+def line_cache():
+    """
+    Open the persistent line cache on first use; None if it is unavailable.
+    Only the main thread uses it: some dbm backends (dbm.sqlite3) only work
+    in the thread that opened them, and atexit closes it on the main thread.
+    """
+    global _line_shelf, _line_shelf_failed
+    if threading.current_thread() is not threading.main_thread():
+        return None
+    if _line_shelf is None and not _line_shelf_failed:
+        try:
+            _line_shelf = shelve.open(LINE_CACHE_FILE, flag='c', protocol=5)
+        except (OSError, *dbm.error):
+            # fall back to the in-memory lru_cache only
+            _line_shelf_failed = True
+        else:
+            atexit.register(_line_shelf.close)
+    return _line_shelf
+
+def drop_line_cache():
+    """Stop using a line cache that failed to read or write; solves then recompute."""
+    global _line_shelf, _line_shelf_failed
+    shelf, _line_shelf = _line_shelf, None
+    _line_shelf_failed = True
+    if shelf is not None:
+        atexit.unregister(shelf.close)
+        try:
+            shelf.close()
+        except Exception:
+            pass
+
 def parse_clue_line(line):
     line = line.strip()
     if not line:
@@ -9,38 +66,107 @@ def parse_clue_line(line):
     parts = [p for p in line.replace(',', ' ').split() if p]
     return [int(p) for p in parts]
 
+@lru_cache(maxsize=None)
+def clue_suffixes(length, clues):
+    """
+    All fill masks placing the blocks of clues (a tuple) inside length cells,
+    bit 0 being the first cell. Lines sharing a tail of clues reuse the cached
+    enumeration of that tail.
+    """
+    if not clues:
+        return (0,)
+    k = clues[0]
+    rest = clues[1:]
+    rest_min = sum(rest) + len(rest)  # each later block also needs its leading 0
+    block = (1 << k) - 1
+    results = []
+    for i in range(length - k - rest_min + 1):
+        if not rest:
+            results.append(block << i)
+            continue
+        shift = i + k + 1  # block at i, then the mandatory 0 between blocks
+        for tail in clue_suffixes(length - shift, rest):
+            results.append((tail << shift) | (block << i))
+    return tuple(results)
+
 @lru_cache(maxsize=None)
 def line_possibilities(length, clues):
-    """Generate all possible binary tuples matching clues for a line of given length."""
+    """Generate all possible fill masks matching clues for a line of given length.
+
+    Each possibility is an int where bit i is set iff cell i is filled.
+    Results are also kept in the on-disk line cache across runs.
+    """
     if not clues:
-        return [tuple(0 for _ in range(length))]
-    total_blocks = sum(clues)
-    min_required = total_blocks + (len(clues) - 1)
+        return [0]
+    if min(clues) < 0:
+        return []
+    min_required = sum(clues) + (len(clues) - 1)
     if min_required > length:
         return []
-    results = []
-    def build(pos, clue_index, acc):
-        if clue_index == len(clues):
-            if len(acc) <= length and all(v == 0 for v in acc[length:]):
-                acc = acc[:length] if len(acc) >= length else acc + [0] * (length - len(acc))
-                results.append(tuple(acc))
-            return
-        
-        k = clues[clue_index]
-        remaining_space = length - len(acc)
-        remaining_blocks = sum(clues[clue_index:])
-        min_spaces = len(clues) - clue_index - 1  # minimum spaces needed between remaining blocks
-        
-        max_pos = remaining_space - (remaining_blocks + min_spaces)
-        for i in range(max_pos + 1):
-            new_acc = acc + [0] * i + [1] * k
-            if clue_index < len(clues) - 1:
-                new_acc.append(0)  # mandatory space between blocks
-            build(len(new_acc), clue_index + 1, new_acc)
-            
-    build(0, 0, [])
+    # closed forms for the common trivial lines, no enumeration or disk lookup
+    if min_required == length:
+        mask = 0
+        i = 0
+        for k in clues:
+            mask |= ((1 << k) - 1) << i
+            i += k + 1
+        return [mask]
+    if len(clues) == 1:
+        k = clues[0]
+        return [((1 << k) - 1) << i for i in range(length - k + 1)]
+    shelf = line_cache()
+    key = f"{length}:{','.join(map(str, clues))}"
+    if shelf is not None:
+        try:
+            return shelf[key]
+        except KeyError:
+            pass
+        except Exception:
+            # a damaged cache file (e.g. a solve killed mid-write) only costs speed
+            drop_line_cache()
+            shelf = None
+    results = solver_cy.clue_masks(length, clues) if solver_cy is not None else None
+    if results is None:
+        results = list(clue_suffixes(length, clues))
+    if shelf is not None:
+        try:
+            shelf[key] = results
+        except Exception:
+            drop_line_cache()
     return results
 
+@lru_cache(maxsize=None)
+def line_bit_tables(length, clues):
+    """
+    Transpose of line_possibilities(length, clues): entry p is an int with bit k
+    set iff possibility k fills cell p, so the possibilities agreeing with a
+    decided cell are selected with a single AND.
+    """
+    poss = line_possibilities(length, clues)
+    if not poss:
+        return (0,) * length
+    if np is not None and length <= 64:
+        # one vectorized pass per cell: bit p of every mask, packed little-endian
+        masks = np.array(poss, dtype=np.uint64)
+        return tuple(
+            int.from_bytes(np.packbits(((masks >> np.uint64(p)) & np.uint64(1)).astype(np.uint8),
+                                       bitorder='little').tobytes(), 'little')
+            for p in range(length))
+    # the binary strings of all masks back to back (last possibility first, so it
+    # lands on the high bit); every length-th character from length - 1 - p on
+    # is cell p of each mask
+    digits = ''.join([format(m, f'0{length}b') for m in reversed(poss)])
+    return tuple(int(digits[length - 1 - p::length], 2) for p in range(length))
+
+def board_line_keys(row_clues, col_clues):
+    """The (length, clues) pair of every line of a board, rows first, then columns."""
+    R, C = len(row_clues), len(col_clues)
+    return [(C, tuple(rc)) for rc in row_clues] + [(R, tuple(cc)) for cc in col_clues]
+
+def bit_indices(bits):
+    """Positions of the set bits of bits, lowest first."""
+    return [i for i, ch in enumerate(bin(bits)[:1:-1]) if ch == '1']
+
 class NonogramSolver:
     """
     Nonogram solver with a backtracking search.
@@ -58,24 +184,214 @@ class NonogramSolver:
         self.row_clues = tuple(tuple(rc) for rc in row_clues)
         self.col_clues = tuple(tuple(cc) for cc in col_clues)
 
-        self.row_poss = [line_possibilities(self.C, rc) for rc in self.row_clues]
-        self.col_poss = [line_possibilities(self.R, cc) for cc in self.col_clues]
-        # board: None unknown, 0 empty, 1 filled
+        # lines are numbered rows first (0..R-1), then columns (R..R+C-1);
+        # every distinct (length, clues) pair is resolved once, rows and columns alike
+        keys = board_line_keys(self.row_clues, self.col_clues)
+        unique = dict.fromkeys(keys)
+        for key in unique:
+            unique[key] = line_possibilities(*key)
+        self.length = [length for length, _ in keys]
+        self.poss = [unique[key] for key in keys]
+        self.row_poss = self.poss[:self.R]
+        self.col_poss = self.poss[self.R:]
+        # tables[line][p]: which possibilities of line fill cell p (see line_bit_tables)
+        self.tables = [line_bit_tables(*key) for key in keys]
+        # board: None unknown, 0 empty, 1 filled (filled in from the masks after solve)
         self.board = [[None] * self.C for _ in range(self.R)]
-
-        # order rows by fewest possibilities (heuristic)
-        self.row_order = sorted(range(self.R), key=lambda r: len(self.row_poss[r]))
+        self.reset()
 
         self.start_time = None
+        self._deadline = None
         self.nodes = 0
 
-    def is_consistent_with_partial_row(self, r, candidate):
-        for c in range(self.C):
-            val = self.board[r][c]
-            if val is not None and val != candidate[c]:
+    def reset(self):
+        """Forget every decided cell."""
+        # partial board as bitmasks: bit p of known[line] is set when cell p of
+        # the line is decided, and the same bit of fill[line] holds its value.
+        n = self.R + self.C
+        self.known = [0] * n
+        self.fill = [0] * n
+        # still-compatible candidates per line as a bitset over the indices of
+        # self.poss[line], narrowed as cells get decided
+        self.live = [(1 << len(poss)) - 1 for poss in self.poss]
+        # undo log of (line, known, fill, live) snapshots of the lines that
+        # changed, rewound on backtrack
+        self.trail = []
+
+    def line_candidates(self, line):
+        """Live candidate masks of line."""
+        poss = self.poss[line]
+        return [poss[i] for i in bit_indices(self.live[line])]
+
+    def save(self, line):
+        """Record the masks and live candidates of line so undo() can restore them."""
+        self.trail.append((line, self.known[line], self.fill[line], self.live[line]))
+
+    def undo(self, mark):
+        """Rewind every change recorded after trail position mark."""
+        trail = self.trail
+        known, fill, live = self.known, self.fill, self.live
+        while len(trail) > mark:
+            line, known[line], fill[line], live[line] = trail.pop()
+
+    def set_cells(self, line, cells, values):
+        """
+        Decide the cells set in the cells mask of line, taking their values from
+        the values mask, mirror them into the crossing lines and drop the live
+        candidates that disagree. Returns the crossing lines that changed, or
+        None when a line runs out of candidates.
+        """
+        known, fill, live, tables = self.known, self.fill, self.live, self.tables
+        save = self.save
+        # cell p of a row lies on column line R + p, cell p of a column on row p;
+        # the line itself is cell pos of each crossing line
+        R = self.R
+        cross_base, pos = (R, line) if line < R else (0, line - R)
+        save(line)
+        known[line] |= cells
+        fill[line] |= values & cells
+        line_live = live[line]
+        line_tables = tables[line]
+        changed = []
+        while cells:
+            low = cells & -cells
+            p = low.bit_length() - 1
+            filled = values & low
+            line_live &= line_tables[p] if filled else ~line_tables[p]
+            other = cross_base + p
+            save(other)
+            known[other] |= 1 << pos
+            if filled:
+                fill[other] |= 1 << pos
+                live[other] &= tables[other][pos]
+            else:
+                live[other] &= ~tables[other][pos]
+            if not live[other]:
+                return None
+            changed.append(other)
+            cells ^= low
+        live[line] = line_live
+        if not line_live:
+            return None
+        return changed
+
+    def assign(self, line, candidate):
+        """Fix line to candidate. Returns the crossing lines that changed (see set_cells)."""
+        return self.set_cells(line, ((1 << self.length[line]) - 1) & ~self.known[line], candidate)
+
+    def forced_cells(self, line):
+        """
+        The (forced, ones) pair of masks for line: undecided cells all live
+        candidates agree on, and which of those are filled.
+        """
+        live = self.live[line]
+        line_tables = self.tables[line]
+        unknown = ((1 << self.length[line]) - 1) & ~self.known[line]
+        forced = 0
+        ones = 0
+        while unknown:
+            low = unknown & -unknown
+            has = live & line_tables[low.bit_length() - 1]
+            if not has:
+                forced |= low
+            elif has == live:
+                forced |= low
+                ones |= low
+            unknown ^= low
+        return forced, ones
+
+    def propagate(self, lines):
+        """
+        Decide the cells all live candidates of the given lines agree on,
+        re-checking the crossing lines until nothing changes.
+        Returns False on a contradiction.
+        """
+        live = self.live
+        forced_cells = self.forced_cells
+        set_cells = self.set_cells
+        dirty = set(lines)
+        while dirty:
+            line = dirty.pop()
+            if not live[line]:
                 return False
+            forced, ones = forced_cells(line)
+            if forced:
+                changed = set_cells(line, forced, ones)
+                if changed is None:
+                    return False
+                dirty.update(changed)
         return True
 
+    def pick_line(self):
+        """
+        The undecided line with the fewest live candidates (MRV), or None.
+        Ties go to the lowest line number, rows before columns. After
+        propagation an undecided line has at least 2 live candidates, so the
+        scan stops at the first line with 2.
+        """
+        best = None
+        best_count = None
+        for line in range(self.R + self.C):
+            if self.known[line] == (1 << self.length[line]) - 1:
+                continue
+            count = bin(self.live[line]).count('1')
+            if best is None or count < best_count:
+                best, best_count = line, count
+                if count <= 2:
+                    break
+        return best
+
+    def sync_board(self):
+        """Rebuild self.board (None / 0 / 1 cells) from the row masks."""
+        for r in range(self.R):
+            known = self.known[r]
+            fill = self.fill[r]
+            self.board[r] = [((fill >> c) & 1) if (known >> c) & 1 else None
+                             for c in range(self.C)]
+
+    # the compiled kernel runs in node-budget chunks with a time-limit check
+    # in between; the budget starts at KERNEL_CHUNK nodes and is doubled while
+    # a chunk takes under KERNEL_CHUNK_NS (halved when it takes over twice that)
+    KERNEL_CHUNK = 1 << 6
+    KERNEL_CHUNK_MAX = 1 << 14
+    KERNEL_CHUNK_NS = 20_000_000
+    # the python search reads the clock when nodes & TIME_CHECK_MASK == 0
+    TIME_CHECK_MASK = 0xF
+
+    def solve_compiled(self, search, debug):
+        """Run kernel.backtrack in node-budget chunks until done or timed out."""
+        scalars = search['scalars']
+        chunk = self.KERNEL_CHUNK
+        while True:
+            chunk_start = time.monotonic_ns()
+            status = kernel.backtrack(
+                search['poss'], search['poss_off'], search['tables'], search['tab_off'],
+                search['words'], search['live'], search['live_off'], search['state'],
+                search['trail_idx'], search['trail_old'], search['queue'], search['queued'],
+                search['line_at'], search['idx_at'], search['sub'],
+                scalars, self.R, self.C,
+                scalars[kernel.NODES] + chunk)
+            self.nodes = int(scalars[kernel.NODES])
+            if status != kernel.BUDGET:
+                break
+            now = time.monotonic_ns()
+            if self._deadline is not None and now > self._deadline:
+                if debug: print("[solver] timeout in compiled backtrack")
+                break
+            took = now - chunk_start
+            if took < self.KERNEL_CHUNK_NS and chunk < self.KERNEL_CHUNK_MAX:
+                chunk *= 2
+            elif took > 2 * self.KERNEL_CHUNK_NS and chunk > self.KERNEL_CHUNK:
+                chunk //= 2
+
+        state = [int(v) for v in search['state']]
+        N = self.R + self.C
+        self.known = state[:N]
+        self.fill = state[N:2 * N]
+        if debug and status == kernel.SOLVED:
+            print("[solver] all lines decided -> success")
+        return status == kernel.SOLVED
+
     def solve(self, time_limit=None, allow_partial=True, debug=True):
         """
         Backtracking solver. Returns True if solved (and self.board is filled),
@@ -87,6 +403,7 @@ class NonogramSolver:
           - False -> keep the static check (fast-fail if clues impossible for line length).
         """
         self.start_time = time.time()
+        self._deadline = time.monotonic_ns() + int(time_limit * 1e9) if time_limit else None
         self.nodes = 0
         if debug:
             print(f"[solver] R={self.R}, C={self.C}")
@@ -106,60 +423,70 @@ class NonogramSolver:
                         print(f"[solver] static fail: col {c} has 0 possibilities")
                     return False
 
-        # Work copies of column possibilities
-        col_poss_lists = [list(poss) for poss in self.col_poss]
-
-        def col_candidate_compatible_with_partial_col(c, col_candidate):
-            for rr in range(self.R):
-                b = self.board[rr][c]
-                if b is not None and b != col_candidate[rr]:
-                    return False
-            return True
+        self.reset()
+        if not self.propagate(range(self.R + self.C)):
+            if debug: print("[solver] contradiction while propagating the clues")
+            return False
 
-        def backtrack(idx):
-            # timeout
-            if time_limit and (time.time() - self.start_time) > time_limit:
-                if debug: print("[solver] timeout in backtrack")
-                return False
-            if idx == len(self.row_order):
-                if debug: print("[solver] all rows assigned -> success")
-                return True
-
-            self.nodes += 1
-            r = self.row_order[idx]
-            # Candidates filtered against current partial row
-            candidates = [p for p in self.row_poss[r] if self.is_consistent_with_partial_row(r, p)]
-            if not candidates:
-                # No candidate fits current partial board -> backtrack
-                if debug: print(f"[solver] row {r} has no candidates under current board -> backtrack")
-                return False
+        if kernel is not None:
+            search = kernel.new_search(
+                self.R, self.C, self.poss, self.tables, self.live, self.known + self.fill)
+            if search is not None:
+                solved = self.solve_compiled(search, debug)
+                self.sync_board()
+                return solved
 
-            for candidate in candidates:
-                # apply candidate to board row r
-                old_row = list(self.board[r])
-                for c in range(self.C):
-                    self.board[r][c] = candidate[c]
-
-                # Check columns still have at least one compatible possibility
-                ok = True
-                for c in range(self.C):
-                    compatible = False
-                    for col_candidate in col_poss_lists[c]:
-                        if col_candidate_compatible_with_partial_col(c, col_candidate):
-                            compatible = True
-                            break
-                    if not compatible:
-                        ok = False
-                        break
+        solved = self.backtrack(debug)
+        self.sync_board()
+        return solved
 
-                if ok:
-                    if backtrack(idx + 1):
-                        return True
+    def backtrack(self, debug=False):
+        """
+        Depth-first search over line assignments, driven by an explicit stack of
+        (line, remaining candidates, trail mark) frames instead of recursion.
+        """
+        # hoisted lookups, this loop runs once per search node
+        deadline = self._deadline
+        check_mask = self.TIME_CHECK_MASK
+        trail = self.trail
+        pick_line = self.pick_line
+        line_candidates = self.line_candidates
+        assign = self.assign
+        propagate = self.propagate
+        undo = self.undo
+        monotonic_ns = time.monotonic_ns
 
-                # undo row
-                for c in range(self.C):
-                    self.board[r][c] = old_row[c]
+        line = pick_line()
+        if line is None:
+            if debug: print("[solver] all lines decided -> success")
+            return True
+        nodes = self.nodes + 1
+        stack = [(line, iter(line_candidates(line)), len(trail))]
+        try:
+            while stack:
+                line, candidates, mark = stack[-1]
+                # drop whatever the previous candidate of this frame (and its subtree) did
+                undo(mark)
+                for candidate in candidates:
+                    # fix the line to candidate, then narrow the lines crossing it
+                    changed = assign(line, candidate)
+                    if changed is not None and propagate(changed):
+                        break
+                    undo(mark)
+                else:
+                    stack.pop()
+                    continue
 
+                # timeout, only looked at every few nodes to keep the clock off the hot path
+                if deadline is not None and (nodes & check_mask) == 0 and monotonic_ns() > deadline:
+                    if debug: print("[solver] timeout in backtrack")
+                    return False
+                line = pick_line()
+                if line is None:
+                    if debug: print("[solver] all lines decided -> success")
+                    return True
+                nodes += 1
+                stack.append((line, iter(line_candidates(line)), len(trail)))
             return False
-
-        return backtrack(0)
+        finally:
+            self.nodes = nodes
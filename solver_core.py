@@ -0,0 +1,265 @@
+# solver_core.py
+"""
+Numba-compiled backtracking kernel for NonogramSolver (boards up to 64x64).
+
+The array layout and new_search live in kernel_state; solver_cy.pyx is
+the same kernel for builds without numba.
+"""
+import numpy as np
+from numba import njit
+
+from kernel_state import (  # noqa: F401  (re-exported for NonogramSolver)
+    SOLVED, EXHAUSTED, BUDGET, DEPTH, TRAIL_LEN, NODES, REFUTE, new_search,
+)
+
+
+@njit(cache=True, nogil=True)
+def _popcount(x):
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+@njit(cache=True, nogil=True)
+def _push(arr, trail_idx, trail_old, scalars, i, code, val):
+    # code is i for entries of state and -1 - i for words of live
+    t = scalars[TRAIL_LEN]
+    trail_idx[t] = code
+    trail_old[t] = arr[i]
+    scalars[TRAIL_LEN] = t + 1
+    arr[i] = val
+
+
+@njit(cache=True, nogil=True)
+def _undo(state, live, trail_idx, trail_old, scalars, mark):
+    t = scalars[TRAIL_LEN]
+    while t > mark:
+        t -= 1
+        code = trail_idx[t]
+        if code >= 0:
+            state[code] = trail_old[t]
+        else:
+            live[-1 - code] = trail_old[t]
+    scalars[TRAIL_LEN] = t
+
+
+@njit(cache=True, nogil=True)
+def _line_full(line, R, C):
+    length = C if line < R else R
+    if length == 64:
+        return ~np.uint64(0)
+    return (np.uint64(1) << np.uint64(length)) - np.uint64(1)
+
+
+@njit(cache=True, nogil=True)
+def _narrow(line, p, filled, tables, tab_off, words, live, live_off, state,
+            trail_idx, trail_old, scalars, N):
+    """Drop the live candidates of line that disagree with cell p; returns how many are left."""
+    w = words[line]
+    start = live_off[line]
+    tab = tab_off[line] + p * w
+    removed = np.uint64(0)
+    for k in range(w):
+        old = live[start + k]
+        new = old & tables[tab + k] if filled else old & ~tables[tab + k]
+        if new != old:
+            _push(live, trail_idx, trail_old, scalars, start + k, -1 - (start + k), new)
+            removed += _popcount(old ^ new)
+    count = state[2 * N + line]
+    if removed:
+        count -= removed
+        _push(state, trail_idx, trail_old, scalars, 2 * N + line, 2 * N + line, count)
+    return count
+
+
+@njit(cache=True, nogil=True)
+def _set_cells(line, cells, values, R, C, tables, tab_off, words, live, live_off,
+               state, trail_idx, trail_old, queue, queued, tail, scalars):
+    """
+    Decide the cells set in cells (with values) on line and its crossing
+    lines, narrowing and queueing every crossing line. Returns the new tail,
+    or -1 once a crossing line has no candidates left. The line's own
+    candidates are left alone: either they all agree with the cells already
+    or the line is being fixed to one of them.
+    """
+    one = np.uint64(1)
+    zero = np.uint64(0)
+    N = R + C
+    is_row = line < R
+    length = C if is_row else R
+    _push(state, trail_idx, trail_old, scalars, line, line, state[line] | cells)
+    _push(state, trail_idx, trail_old, scalars, N + line, N + line, state[N + line] | (values & cells))
+    pos = line if is_row else line - R
+    bit = one << np.uint64(pos)
+    for p in range(length):
+        b = one << np.uint64(p)
+        if cells & b == zero:
+            continue
+        other = R + p if is_row else p
+        filled = values & b != zero
+        _push(state, trail_idx, trail_old, scalars, other, other, state[other] | bit)
+        if filled:
+            _push(state, trail_idx, trail_old, scalars, N + other, N + other, state[N + other] | bit)
+        if _narrow(other, pos, filled, tables, tab_off, words, live, live_off, state,
+                   trail_idx, trail_old, scalars, N) == zero:
+            return -1
+        if queued[other] == 0:
+            queued[other] = 1
+            queue[tail] = other
+            tail = (tail + 1) % (N + 1)
+    return tail
+
+
+@njit(cache=True, nogil=True)
+def _propagate(R, C, tables, tab_off, words, live, live_off, state, trail_idx, trail_old,
+               queue, queued, head, tail, scalars):
+    """
+    Decide the cells that all live candidates of the lines queued in
+    queue[head:tail] (a ring buffer of N + 1 slots) agree on, queueing the
+    crossing lines, until the queue is empty. Returns False on a contradiction.
+    """
+    one = np.uint64(1)
+    zero = np.uint64(0)
+    N = R + C
+    ok = True
+    while head != tail:
+        line = queue[head]
+        head = (head + 1) % (N + 1)
+        queued[line] = 0
+
+        length = C if line < R else R
+        unknown = _line_full(line, R, C) & ~state[line]
+        w = words[line]
+        start = live_off[line]
+        forced = zero
+        ones = zero
+        for p in range(length):
+            b = one << np.uint64(p)
+            if unknown & b == zero:
+                continue
+            tab = tab_off[line] + p * w
+            has_one = False
+            has_zero = False
+            for k in range(w):
+                if live[start + k] & tables[tab + k]:
+                    has_one = True
+                if live[start + k] & ~tables[tab + k]:
+                    has_zero = True
+                if has_one and has_zero:
+                    break
+            if not has_one:
+                forced |= b
+            elif not has_zero:
+                forced |= b
+                ones |= b
+        if forced != zero:
+            new_tail = _set_cells(line, forced, ones, R, C, tables, tab_off, words, live,
+                                  live_off, state, trail_idx, trail_old, queue, queued,
+                                  tail, scalars)
+            if new_tail < 0:
+                ok = False
+                break
+            tail = new_tail
+
+    if not ok:
+        # drop whatever is left in the queue, including lines _set_cells
+        # queued before it failed
+        queued[:] = 0
+    return ok
+
+
+@njit(cache=True, nogil=True)
+def _pick_line(R, C, state):
+    """The undecided line with the fewest live candidates (first one on ties), or -1."""
+    N = R + C
+    best = -1
+    best_count = np.uint64(0)
+    for line in range(N):
+        if state[line] == _line_full(line, R, C):
+            continue
+        count = state[2 * N + line]
+        if best == -1 or count < best_count:
+            best = line
+            best_count = count
+            # nothing undecided goes below 2 once propagation settled
+            if count <= 2:
+                break
+    return best
+
+
+@njit(cache=True, nogil=True)
+def _first_live(line, words, live, live_off):
+    """Index of the lowest live candidate of line, or -1."""
+    start = live_off[line]
+    for k in range(words[line]):
+        x = live[start + k]
+        if x:
+            low = x & (~x + np.uint64(1))
+            return k * 64 + np.int64(_popcount(low - np.uint64(1)))
+    return -1
+
+
+@njit(cache=True, nogil=True)
+def backtrack(poss, poss_off, tables, tab_off, words, live, live_off, state,
+              trail_idx, trail_old, queue, queued, line_at, idx_at, sub, scalars,
+              R, C, node_limit):
+    """
+    Branch on the undecided line with the fewest live candidates: first fix it
+    to its first live candidate, and once that fails drop the candidate and
+    propagate again. Runs until the board is solved (SOLVED), the search space
+    is exhausted (EXHAUSTED) or scalars[NODES] reaches node_limit (BUDGET;
+    call again with a larger limit to resume).
+
+    Per depth d, line_at[d] / idx_at[d] hold the current choice and sub[d]
+    the trail length right before it was applied.
+    """
+    one = np.uint64(1)
+    N = R + C
+    while True:
+        if scalars[NODES] >= node_limit:
+            return BUDGET
+        d = scalars[DEPTH]
+
+        if scalars[REFUTE]:
+            # the choice at depth d failed: undo it and remove its candidate
+            scalars[REFUTE] = 0
+            _undo(state, live, trail_idx, trail_old, scalars, sub[d])
+            line = line_at[d]
+            idx = idx_at[d]
+            k = live_off[line] + idx // 64
+            _push(live, trail_idx, trail_old, scalars, k, -1 - k,
+                  live[k] & ~(one << np.uint64(idx % 64)))
+            count = state[2 * N + line] - one
+            _push(state, trail_idx, trail_old, scalars, 2 * N + line, 2 * N + line, count)
+            ok = count > 0
+            if ok:
+                queued[line] = 1
+                queue[0] = line
+                ok = _propagate(R, C, tables, tab_off, words, live, live_off, state,
+                                trail_idx, trail_old, queue, queued, 0, 1, scalars)
+            if not ok:
+                if d == 0:
+                    return EXHAUSTED
+                scalars[DEPTH] = d - 1
+                scalars[REFUTE] = 1
+                continue
+
+        line = _pick_line(R, C, state)
+        if line == -1:
+            return SOLVED
+        scalars[NODES] += 1
+        idx = _first_live(line, words, live, live_off)
+        line_at[d] = line
+        idx_at[d] = idx
+        sub[d] = scalars[TRAIL_LEN]
+        cells = _line_full(line, R, C) & ~state[line]
+        tail = _set_cells(line, cells, poss[poss_off[line] + idx], R, C, tables, tab_off,
+                          words, live, live_off, state, trail_idx, trail_old,
+                          queue, queued, 0, scalars)
+        if tail >= 0 and _propagate(R, C, tables, tab_off, words, live, live_off, state,
+                                    trail_idx, trail_old, queue, queued, 0, tail, scalars):
+            scalars[DEPTH] = d + 1
+        else:
+            queued[:] = 0
+            scalars[REFUTE] = 1
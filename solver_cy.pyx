@@ -0,0 +1,370 @@
+# solver_cy.pyx
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Cython build of the solver hot paths, for deployments without numba
+(frozen builds, plain CPython). Build in place with
+
+    python setup.py build_ext --inplace
+
+clue_masks enumerates line possibilities in the same order as
+solver.clue_suffixes; backtrack is solver_core.backtrack compiled ahead of
+time, on the same arrays (see kernel_state).
+"""
+from libc.stdlib cimport malloc, realloc, free
+
+from kernel_state import (  # re-exported for NonogramSolver
+    SOLVED, EXHAUSTED, BUDGET, NODES, new_search,
+)
+
+ctypedef unsigned long long u64
+ctypedef long long i64
+
+cdef enum:
+    MAX_BLOCKS = 32  # a 64 cell line has at most 32 blocks
+
+
+def clue_masks(int length, tuple clues):
+    """
+    All fill masks of clues on a line of length cells, or None when the line
+    is too long for 64-bit masks (the caller then uses the python enumerator).
+    """
+    cdef int n = len(clues)
+    cdef int k[MAX_BLOCKS]
+    cdef int need[MAX_BLOCKS]
+    cdef int pos[MAX_BLOCKS]
+    cdef u64 block[MAX_BLOCKS]
+    cdef u64 acc[MAX_BLOCKS]
+    cdef int j
+    if length > 64 or n == 0 or n > MAX_BLOCKS:
+        return None
+    for j in range(n):
+        k[j] = clues[j]
+        if k[j] < 0:
+            return None
+        block[j] = <u64>-1 if k[j] == 64 else ((<u64>1) << k[j]) - 1
+    # need[j]: cells from the start of block j to the end of the line
+    need[n - 1] = k[n - 1]
+    for j in range(n - 2, -1, -1):
+        need[j] = k[j] + 1 + need[j + 1]
+
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t cap = 64
+    cdef u64 *out = <u64 *>malloc(cap * sizeof(u64))
+    cdef u64 *grown
+    cdef u64 m
+    cdef bint failed = False
+    if out == NULL:
+        raise MemoryError()
+    with nogil:
+        j = 0
+        pos[0] = 0
+        acc[0] = 0
+        while True:
+            if pos[j] > length - need[j]:
+                if j == 0:
+                    break
+                j -= 1
+                pos[j] += 1
+                continue
+            m = acc[j] | (block[j] << pos[j])
+            if j < n - 1:
+                acc[j + 1] = m
+                pos[j + 1] = pos[j] + k[j] + 1
+                j += 1
+                continue
+            if count == cap:
+                cap *= 2
+                grown = <u64 *>realloc(out, cap * sizeof(u64))
+                if grown == NULL:
+                    failed = True
+                    break
+                out = grown
+            out[count] = m
+            count += 1
+            pos[j] += 1
+    try:
+        if failed:
+            raise MemoryError()
+        return [out[i] for i in range(count)]
+    finally:
+        free(out)
+
+
+# plain C copies of the scalars slots for the nogil code
+cdef enum:
+    DEPTH_ = 0
+    TRAIL_LEN_ = 1
+    NODES_ = 2
+    REFUTE_ = 3
+
+
+cdef struct Search:
+    u64 *poss
+    i64 *poss_off
+    u64 *tables
+    i64 *tab_off
+    i64 *words
+    u64 *live
+    i64 *live_off
+    u64 *state
+    i64 *trail_idx
+    u64 *trail_old
+    i64 *queue
+    unsigned char *queued
+    i64 *scalars
+    int R
+    int C
+    int N
+
+
+cdef inline u64 popcount(u64 x) noexcept nogil:
+    x = x - ((x >> 1) & 0x5555555555555555ULL)
+    x = (x & 0x3333333333333333ULL) + ((x >> 2) & 0x3333333333333333ULL)
+    x = (x + (x >> 4)) & 0x0F0F0F0F0F0F0F0FULL
+    return (x * 0x0101010101010101ULL) >> 56
+
+
+cdef inline void push_state(Search *s, i64 i, u64 val) noexcept nogil:
+    cdef i64 t = s.scalars[TRAIL_LEN_]
+    s.trail_idx[t] = i
+    s.trail_old[t] = s.state[i]
+    s.scalars[TRAIL_LEN_] = t + 1
+    s.state[i] = val
+
+
+cdef inline void push_live(Search *s, i64 i, u64 val) noexcept nogil:
+    cdef i64 t = s.scalars[TRAIL_LEN_]
+    s.trail_idx[t] = -1 - i
+    s.trail_old[t] = s.live[i]
+    s.scalars[TRAIL_LEN_] = t + 1
+    s.live[i] = val
+
+
+cdef void undo(Search *s, i64 mark) noexcept nogil:
+    cdef i64 t = s.scalars[TRAIL_LEN_]
+    cdef i64 code
+    while t > mark:
+        t -= 1
+        code = s.trail_idx[t]
+        if code >= 0:
+            s.state[code] = s.trail_old[t]
+        else:
+            s.live[-1 - code] = s.trail_old[t]
+    s.scalars[TRAIL_LEN_] = t
+
+
+cdef inline u64 line_full(Search *s, int line) noexcept nogil:
+    cdef int length = s.C if line < s.R else s.R
+    if length == 64:
+        return <u64>-1
+    return ((<u64>1) << length) - 1
+
+
+cdef u64 narrow(Search *s, int line, int p, bint filled) noexcept nogil:
+    """Drop the live candidates of line that disagree with cell p; returns how many are left."""
+    cdef i64 w = s.words[line]
+    cdef i64 start = s.live_off[line]
+    cdef i64 tab = s.tab_off[line] + p * w
+    cdef u64 removed = 0
+    cdef u64 old, new, count
+    cdef i64 i
+    for i in range(w):
+        old = s.live[start + i]
+        new = old & s.tables[tab + i] if filled else old & ~s.tables[tab + i]
+        if new != old:
+            push_live(s, start + i, new)
+            removed += popcount(old ^ new)
+    count = s.state[2 * s.N + line]
+    if removed:
+        count -= removed
+        push_state(s, 2 * s.N + line, count)
+    return count
+
+
+cdef i64 set_cells(Search *s, int line, u64 cells, u64 values, i64 tail) noexcept nogil:
+    """
+    Decide cells (with values) on line and its crossing lines, narrowing and
+    queueing the crossing lines. Returns the new tail, or -1 once a crossing
+    line has no candidates left.
+    """
+    cdef int N = s.N
+    cdef bint is_row = line < s.R
+    cdef int length = s.C if is_row else s.R
+    cdef int pos = line if is_row else line - s.R
+    cdef u64 bit = (<u64>1) << pos
+    cdef u64 b
+    cdef int p, other
+    cdef bint filled
+    push_state(s, line, s.state[line] | cells)
+    push_state(s, N + line, s.state[N + line] | (values & cells))
+    for p in range(length):
+        b = (<u64>1) << p
+        if not cells & b:
+            continue
+        other = s.R + p if is_row else p
+        filled = (values & b) != 0
+        push_state(s, other, s.state[other] | bit)
+        if filled:
+            push_state(s, N + other, s.state[N + other] | bit)
+        if narrow(s, other, pos, filled) == 0:
+            return -1
+        if not s.queued[other]:
+            s.queued[other] = 1
+            s.queue[tail] = other
+            tail = (tail + 1) % (N + 1)
+    return tail
+
+
+cdef bint propagate(Search *s, i64 head, i64 tail) noexcept nogil:
+    """Decide the cells the live candidates of the queued lines agree on, to a fixpoint."""
+    cdef int N = s.N
+    cdef int line, length, p
+    cdef i64 w, start, tab, i, new_tail
+    cdef u64 unknown, forced, ones, b
+    cdef bint has_one, has_zero
+    while head != tail:
+        line = <int>s.queue[head]
+        head = (head + 1) % (N + 1)
+        s.queued[line] = 0
+
+        length = s.C if line < s.R else s.R
+        unknown = line_full(s, line) & ~s.state[line]
+        w = s.words[line]
+        start = s.live_off[line]
+        forced = 0
+        ones = 0
+        for p in range(length):
+            b = (<u64>1) << p
+            if not unknown & b:
+                continue
+            tab = s.tab_off[line] + p * w
+            has_one = False
+            has_zero = False
+            for i in range(w):
+                if s.live[start + i] & s.tables[tab + i]:
+                    has_one = True
+                if s.live[start + i] & ~s.tables[tab + i]:
+                    has_zero = True
+                if has_one and has_zero:
+                    break
+            if not has_one:
+                forced |= b
+            elif not has_zero:
+                forced |= b
+                ones |= b
+        if forced:
+            new_tail = set_cells(s, line, forced, ones, tail)
+            if new_tail < 0:
+                for i in range(N):
+                    s.queued[i] = 0
+                return False
+            tail = new_tail
+    return True
+
+
+cdef int pick_line(Search *s) noexcept nogil:
+    """The undecided line with the fewest live candidates (first one on ties), or -1."""
+    cdef int best = -1
+    cdef u64 best_count = 0
+    cdef u64 count
+    cdef int line
+    for line in range(s.N):
+        if s.state[line] == line_full(s, line):
+            continue
+        count = s.state[2 * s.N + line]
+        if best == -1 or count < best_count:
+            best = line
+            best_count = count
+            if count <= 2:
+                break
+    return best
+
+
+cdef i64 first_live(Search *s, int line) noexcept nogil:
+    cdef i64 start = s.live_off[line]
+    cdef i64 i
+    cdef u64 x
+    for i in range(s.words[line]):
+        x = s.live[start + i]
+        if x:
+            return i * 64 + <i64>popcount((x & (~x + 1)) - 1)
+    return -1
+
+
+cdef int run(Search *s, i64 *line_at, i64 *idx_at, i64 *sub, i64 node_limit) noexcept nogil:
+    cdef i64 d, idx, k, tail
+    cdef int line
+    cdef u64 count
+    cdef bint ok
+    while True:
+        if s.scalars[NODES_] >= node_limit:
+            return -1
+        d = s.scalars[DEPTH_]
+
+        if s.scalars[REFUTE_]:
+            # the choice at depth d failed: undo it and remove its candidate
+            s.scalars[REFUTE_] = 0
+            undo(s, sub[d])
+            line = <int>line_at[d]
+            idx = idx_at[d]
+            k = s.live_off[line] + idx // 64
+            push_live(s, k, s.live[k] & ~((<u64>1) << (idx % 64)))
+            count = s.state[2 * s.N + line] - 1
+            push_state(s, 2 * s.N + line, count)
+            ok = count > 0
+            if ok:
+                s.queued[line] = 1
+                s.queue[0] = line
+                ok = propagate(s, 0, 1)
+            if not ok:
+                if d == 0:
+                    return 0
+                s.scalars[DEPTH_] = d - 1
+                s.scalars[REFUTE_] = 1
+                continue
+
+        line = pick_line(s)
+        if line == -1:
+            return 1
+        s.scalars[NODES_] += 1
+        idx = first_live(s, line)
+        line_at[d] = line
+        idx_at[d] = idx
+        sub[d] = s.scalars[TRAIL_LEN_]
+        tail = set_cells(s, line, line_full(s, line) & ~s.state[line],
+                         s.poss[s.poss_off[line] + idx], 0)
+        if tail >= 0 and propagate(s, 0, tail):
+            s.scalars[DEPTH_] = d + 1
+        else:
+            for k in range(s.N):
+                s.queued[k] = 0
+            s.scalars[REFUTE_] = 1
+
+
+def backtrack(u64[::1] poss, i64[::1] poss_off, u64[::1] tables, i64[::1] tab_off,
+              i64[::1] words, u64[::1] live, i64[::1] live_off, u64[::1] state,
+              i64[::1] trail_idx, u64[::1] trail_old, i64[::1] queue, unsigned char[::1] queued,
+              i64[::1] line_at, i64[::1] idx_at, i64[::1] sub, i64[::1] scalars,
+              int R, int C, i64 node_limit):
+    """Same contract as solver_core.backtrack; returns SOLVED, EXHAUSTED or BUDGET."""
+    cdef Search s
+    cdef int status
+    s.poss = &poss[0]
+    s.poss_off = &poss_off[0]
+    s.tables = &tables[0]
+    s.tab_off = &tab_off[0]
+    s.words = &words[0]
+    s.live = &live[0]
+    s.live_off = &live_off[0]
+    s.state = &state[0]
+    s.trail_idx = &trail_idx[0]
+    s.trail_old = &trail_old[0]
+    s.queue = &queue[0]
+    s.queued = &queued[0]
+    s.scalars = &scalars[0]
+    s.R = R
+    s.C = C
+    s.N = R + C
+    with nogil:
+        status = run(&s, &line_at[0], &idx_at[0], &sub[0], node_limit)
+    return status
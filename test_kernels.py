@@ -0,0 +1,143 @@
+# test_kernels.py
+"""
+Checks that every search backend (plain python, the numba kernel in
+solver_core, the Cython build solver_cy) solves the same random boards
+correctly. Backends that cannot be imported are skipped.
+
+    python -m unittest test_kernels
+"""
+import itertools
+import random
+import unittest
+
+import solver
+from solver import NonogramSolver
+
+
+def runs(cells):
+    """The clue of a line of 0/1 cells."""
+    out = []
+    n = 0
+    for v in list(cells) + [0]:
+        if v:
+            n += 1
+        elif n:
+            out.append(n)
+            n = 0
+    return out
+
+
+def board_clues(grid):
+    rows = [runs(row) for row in grid]
+    cols = [runs(col) for col in zip(*grid)]
+    return rows, cols
+
+
+def brute_force_solvable(rows, cols):
+    """Whether any 0/1 grid matches the clues (tiny boards only)."""
+    R, C = len(rows), len(cols)
+    for bits in itertools.product((0, 1), repeat=R * C):
+        grid = [bits[r * C:(r + 1) * C] for r in range(R)]
+        if board_clues(grid) == (rows, cols):
+            return True
+    return False
+
+
+def random_boards(seed, count, max_size):
+    """(rows, cols) clues of random boards; some get a column clue swapped out."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        R = rng.randint(1, max_size)
+        C = rng.randint(1, max_size)
+        p = rng.random()
+        grid = [[1 if rng.random() < p else 0 for _ in range(C)] for _ in range(R)]
+        rows, cols = board_clues(grid)
+        if rng.random() < 0.25:
+            cols[rng.randrange(C)] = [rng.randint(1, 3)]
+        yield rows, cols
+
+
+class KernelAgreement:
+    """Mixin: runs the checks with solver.kernel set to self.backend()."""
+
+    def backend(self):
+        return None
+
+    def setUp(self):
+        self.saved_kernel = solver.kernel
+        solver.kernel = self.backend()
+
+    def tearDown(self):
+        solver.kernel = self.saved_kernel
+
+    def check(self, rows, cols, expect_solvable=None):
+        s = NonogramSolver(rows, cols)
+        solved = s.solve(time_limit=30, debug=False)
+        if solved:
+            grid = [[cell for cell in row] for row in s.board]
+            self.assertEqual(board_clues(grid), (rows, cols))
+        elif expect_solvable is not None:
+            self.assertFalse(expect_solvable, (rows, cols))
+        return solved
+
+    def test_tiny_boards_against_brute_force(self):
+        for rows, cols in random_boards(1, 150, 4):
+            if len(rows) * len(cols) <= 12:
+                self.check(rows, cols, brute_force_solvable(rows, cols))
+
+    def test_generated_boards_are_solved(self):
+        rng = random.Random(2)
+        for _ in range(60):
+            R, C = rng.randint(5, 15), rng.randint(5, 15)
+            grid = [[rng.randint(0, 1) for _ in range(C)] for _ in range(R)]
+            rows, cols = board_clues(grid)
+            self.assertTrue(self.check(rows, cols), (rows, cols))
+
+    def test_resume_every_node(self):
+        # a one-node budget makes the compiled kernels stop and resume at every node
+        saved = NonogramSolver.KERNEL_CHUNK, NonogramSolver.KERNEL_CHUNK_MAX
+        NonogramSolver.KERNEL_CHUNK = NonogramSolver.KERNEL_CHUNK_MAX = 1
+        try:
+            for rows, cols in random_boards(3, 80, 8):
+                self.check(rows, cols)
+        finally:
+            NonogramSolver.KERNEL_CHUNK, NonogramSolver.KERNEL_CHUNK_MAX = saved
+
+
+class PythonSearchTest(KernelAgreement, unittest.TestCase):
+    pass
+
+
+class NumbaKernelTest(KernelAgreement, unittest.TestCase):
+    def backend(self):
+        if solver.solver_core is None:
+            self.skipTest('numba kernel not available')
+        return solver.solver_core
+
+
+class CythonKernelTest(KernelAgreement, unittest.TestCase):
+    def backend(self):
+        if solver.solver_cy is None:
+            self.skipTest('Cython build not available (python setup.py build_ext --inplace)')
+        return solver.solver_cy
+
+
+class BackendsAgree(unittest.TestCase):
+    def test_same_answers(self):
+        backends = [None] + [k for k in (solver.solver_core, solver.solver_cy) if k is not None]
+        if len(backends) == 1:
+            self.skipTest('no compiled backend available')
+        saved = solver.kernel
+        try:
+            for rows, cols in random_boards(4, 80, 10):
+                answers = set()
+                for k in backends:
+                    solver.kernel = k
+                    answers.add(NonogramSolver(rows, cols).solve(time_limit=30, debug=False))
+                self.assertEqual(len(answers), 1, (rows, cols))
+        finally:
+            solver.kernel = saved
+
+
+if __name__ == '__main__':
+    unittest.main()